@@ -2,12 +2,54 @@
  * Integration tests for the Python adjudication bridge.
  * These call the real Python subprocess — requires .venv with diplomacy installed.
  */
+import { spawn } from 'node:child_process';
+import { mkdtempSync, readFileSync, rmSync } from 'node:fs';
+import { tmpdir } from 'node:os';
+import { join, resolve } from 'node:path';
+import { createInterface } from 'node:readline';
 import { describe, expect, it } from 'vitest';
-import { getPossibleOrders, newGame, renderMap, setOrdersAndProcess } from './adjudicator.js';
+import {
+	batchProcess,
+	callAdjudicator,
+	getPossibleOrders,
+	newGame,
+	parseResponse,
+	renderMap,
+	setOrdersAndProcess,
+} from './adjudicator.js';
 
 // Set PYTHON_PATH to use the project venv
 process.env['PYTHON_PATH'] = `${import.meta.dirname}/../../../.venv/bin/python3`;
 
+const SCRIPT_PATH = resolve(import.meta.dirname, '../../../scripts/adjudicate.py');
+
+interface ServerResponse {
+	ok: boolean;
+	result?: Record<string, unknown>;
+	error?: string;
+}
+
+/** Start the adjudicator in --server mode; send() resolves with the response line for a request */
+function startServer(): {
+	send: (request: unknown) => Promise<ServerResponse>;
+	close: () => void;
+} {
+	const proc = spawn(process.env['PYTHON_PATH'] ?? 'python3', [SCRIPT_PATH, '--server'], {
+		stdio: ['pipe', 'pipe', 'pipe'],
+	});
+	const pending: ((line: string) => void)[] = [];
+	// Every stdout line must be a response — library warnings go to stderr
+	createInterface({ input: proc.stdout }).on('line', (line) => pending.shift()?.(line));
+	return {
+		send: (request) =>
+			new Promise((resolveP) => {
+				pending.push((line) => resolveP(JSON.parse(line) as ServerResponse));
+				proc.stdin.write(`${JSON.stringify(request)}\n`);
+			}),
+		close: () => proc.stdin.end(),
+	};
+}
+
 describe('adjudicator integration', () => {
 	it('creates a new game with correct initial state', async () => {
 		const result = await newGame();
@@ -107,6 +149,19 @@ describe('adjudicator integration', () => {
 		expect(map.svg.length).toBeGreaterThan(10000); // SVG is ~108K chars
 	});
 
+	it('keeps power coloring only on supply centers', async () => {
+		const game = await newGame();
+		const result = await setOrdersAndProcess(
+			game.gameState,
+			{ FRANCE: ['A PAR - BUR', 'A MAR - SPA', 'F BRE - MAO'] },
+			true,
+		);
+
+		// Burgundy is French-influenced but not a supply center; Paris is a French SC
+		expect(result.svg).toMatch(/<path class="nopower"[^>]*id="_bur"/);
+		expect(result.svg).toMatch(/<path class="france"[^>]*id="_par"/);
+	});
+
 	it('handles civil disorder (missing orders)', async () => {
 		const game = await newGame();
 
@@ -121,4 +176,240 @@ describe('adjudicator integration', () => {
 		// Everyone else held (civil disorder default)
 		expect(result.units['ENGLAND']).toEqual(expect.arrayContaining(['F EDI', 'F LON', 'A LVP']));
 	});
+
+	it('omits game_state but keeps order_results when want_full_state is false', async () => {
+		const game = await newGame();
+
+		const result = await callAdjudicator({
+			op: 'set_orders_and_process',
+			game_state: game.gameState,
+			orders: { FRANCE: ['A PAR - BUR'] },
+			want_full_state: false,
+		});
+
+		expect(result).not.toHaveProperty('game_state');
+		expect(result['phase']).toBe('F1901M');
+		expect(result['order_results']).toMatchObject({
+			orders: { FRANCE: ['A PAR - BUR'] },
+		});
+	});
+
+	it('writes the SVG to svg_out and returns its path instead', async () => {
+		const game = await newGame();
+		const dir = mkdtempSync(join(tmpdir(), 'adjudicator-'));
+		try {
+			const mapPath = join(dir, 'map.svg');
+			const map = await callAdjudicator({
+				op: 'render_map',
+				game_state: game.gameState,
+				svg_out: mapPath,
+			});
+			expect(map).not.toHaveProperty('svg');
+			expect(map['svg_path']).toBe(mapPath);
+			expect(readFileSync(mapPath, 'utf-8')).toContain('<svg');
+
+			const processedPath = join(dir, 'processed.svg');
+			const processed = await callAdjudicator({
+				op: 'set_orders_and_process',
+				game_state: game.gameState,
+				orders: {},
+				render: true,
+				svg_out: processedPath,
+			});
+			expect(processed).not.toHaveProperty('svg');
+			expect(processed['svg_path']).toBe(processedPath);
+			expect(readFileSync(processedPath, 'utf-8')).toContain('<svg');
+		} finally {
+			rmSync(dir, { recursive: true, force: true });
+		}
+	});
+
+	it('returns only the requested get_state fields', async () => {
+		const game = await newGame();
+
+		const centersOnly = await callAdjudicator({
+			op: 'get_state',
+			game_state: game.gameState,
+			include: ['centers'],
+		});
+		expect(Object.keys(centersOnly)).toEqual(['centers']);
+		expect(centersOnly['centers']).toEqual(game.centers);
+
+		const full = await callAdjudicator({ op: 'get_state', game_state: game.gameState });
+		expect(Object.keys(full).sort()).toEqual(['centers', 'is_game_done', 'phase', 'units']);
+	});
+
+	it('rejects a malformed get_state include', async () => {
+		const game = await newGame();
+
+		await expect(
+			callAdjudicator({ op: 'get_state', game_state: game.gameState, include: 'centers,phase' }),
+		).rejects.toThrow('include must be a list of field names');
+		await expect(
+			callAdjudicator({ op: 'get_state', game_state: game.gameState, include: ['units', 'phaze'] }),
+		).rejects.toThrow('Unknown include fields: phaze');
+	});
+
+	it('batch-processes order sets, each matching a single process call', async () => {
+		const game = await newGame();
+		const baseState = JSON.stringify(game.gameState);
+		const ordersList = [
+			{ FRANCE: ['A PAR - BUR', 'A MAR - SPA'] },
+			{ FRANCE: ['A PAR - PIC'], GERMANY: ['A MUN - BUR'] },
+			{},
+		];
+
+		const batch = await batchProcess(game.gameState, ordersList);
+		expect(batch).toHaveLength(ordersList.length);
+
+		for (const [i, orders] of ordersList.entries()) {
+			const single = await setOrdersAndProcess(game.gameState, orders);
+			expect(batch[i]?.phase).toBe(single.phase);
+			expect(batch[i]?.units).toEqual(single.units);
+			expect(batch[i]?.orderResults).toEqual(single.orderResults);
+		}
+		expect(batch[0]?.units['FRANCE']).toContain('A BUR');
+		expect(batch[1]?.units['FRANCE']).toContain('A PIC');
+		expect(JSON.stringify(game.gameState)).toBe(baseState);
+	});
+});
+
+describe('parseResponse', () => {
+	it('parses a complete response', () => {
+		expect(parseResponse('{"ok":true,"result":{"phase":"S1901M"}}')).toEqual({
+			ok: true,
+			result: { phase: 'S1901M' },
+		});
+	});
+
+	it('falls back to the error line after a truncated response', () => {
+		const output =
+			'{"ok":true,"result":{"game_state":{"id":"abc"}\n' +
+			'{"ok":false,"error":"TypeError: Type is not JSON serializable: object"}\n';
+		expect(parseResponse(output)).toEqual({
+			ok: false,
+			error: 'TypeError: Type is not JSON serializable: object',
+		});
+	});
+
+	it('throws when a single-line response is malformed', () => {
+		expect(() => parseResponse('{"ok":true,"result":')).toThrow();
+	});
+});
+
+describe('adjudicator server mode', () => {
+	it('keeps games in memory by game_id until closed', async () => {
+		const server = startServer();
+		try {
+			const created = await server.send({ op: 'new_game' });
+			expect(created.ok).toBe(true);
+			const gameId = created.result?.['game_id'] as string;
+			expect(gameId).toBeTruthy();
+
+			const processed = await server.send({
+				op: 'set_orders_and_process',
+				game_id: gameId,
+				orders: { FRANCE: ['A PAR - BUR'] },
+			});
+			expect(processed.result?.['phase']).toBe('F1901M');
+
+			// The in-memory game was mutated in place
+			const state = await server.send({ op: 'get_state', game_id: gameId });
+			expect(state.result?.['phase']).toBe('F1901M');
+			expect((state.result?.['units'] as Record<string, string[]>)['FRANCE']).toContain('A BUR');
+
+			const closed = await server.send({ op: 'close_game', game_id: gameId });
+			expect(closed.result?.['closed']).toBe(true);
+
+			const missing = await server.send({ op: 'get_state', game_id: gameId });
+			expect(missing.ok).toBe(false);
+			expect(missing.error).toBe(`Unknown game_id: ${gameId}`);
+		} finally {
+			server.close();
+		}
+	});
+
+	it('batch-processes against copies, leaving the in-memory game unchanged', async () => {
+		const server = startServer();
+		try {
+			const created = await server.send({ op: 'new_game' });
+			const gameId = created.result?.['game_id'] as string;
+
+			const batch = await server.send({
+				op: 'batch_process',
+				game_id: gameId,
+				orders_list: [{ FRANCE: ['A PAR - BUR'] }, { FRANCE: ['A PAR - PIC'] }],
+				want_full_state: false,
+			});
+			const results = batch.result?.['results'] as Record<string, unknown>[];
+			expect(results).toHaveLength(2);
+			expect((results[0]?.['units'] as Record<string, string[]>)['FRANCE']).toContain('A BUR');
+			expect((results[1]?.['units'] as Record<string, string[]>)['FRANCE']).toContain('A PIC');
+
+			const state = await server.send({ op: 'get_state', game_id: gameId });
+			expect(state.result?.['phase']).toBe('S1901M');
+			expect((state.result?.['units'] as Record<string, string[]>)['FRANCE']).toContain('A PAR');
+		} finally {
+			server.close();
+		}
+	});
+
+	it('keeps library warnings off stdout so responses stay one per line', async () => {
+		const game = await newGame();
+		const server = startServer();
+		try {
+			// An illegal move on a game loaded from game_state makes the library print warnings
+			const processed = await server.send({
+				op: 'set_orders_and_process',
+				game_state: game.gameState,
+				orders: { FRANCE: ['A PAR - MUN'] },
+				want_full_state: false,
+			});
+			expect(processed.ok).toBe(true);
+			expect(processed.result?.['phase']).toBe('F1901M');
+
+			const state = await server.send({ op: 'get_state', game_state: game.gameState });
+			expect(state.result?.['phase']).toBe('S1901M');
+		} finally {
+			server.close();
+		}
+	});
+
+	it('fails on a bad svg_out path before processing the phase', async () => {
+		const server = startServer();
+		try {
+			const created = await server.send({ op: 'new_game' });
+			const gameId = created.result?.['game_id'] as string;
+
+			const failed = await server.send({
+				op: 'set_orders_and_process',
+				game_id: gameId,
+				orders: {},
+				render: true,
+				svg_out: join(tmpdir(), 'no-such-dir', 'map.svg'),
+			});
+			expect(failed.ok).toBe(false);
+			expect(failed.error).toContain('FileNotFoundError');
+
+			// The in-memory game must not have advanced
+			const state = await server.send({ op: 'get_state', game_id: gameId });
+			expect(state.result?.['phase']).toBe('S1901M');
+		} finally {
+			server.close();
+		}
+	});
+
+	it('rejects non-object requests without dropping the worker', async () => {
+		const server = startServer();
+		try {
+			const list = await server.send([1, 2]);
+			expect(list.ok).toBe(false);
+			expect(list.error).toContain('JSON object');
+
+			const created = await server.send({ op: 'new_game' });
+			expect(created.ok).toBe(true);
+		} finally {
+			server.close();
+		}
+	});
 });
@@ -14,19 +14,37 @@ function getPythonPath(): string {
 	return process.env['PYTHON_PATH'] ?? 'python3';
 }
 
-interface AdjudicatorResponse {
+export interface AdjudicatorResponse {
 	ok: boolean;
 	result?: Record<string, unknown>;
 	error?: string;
 }
 
+/**
+ * Parse the adjudicator's stdout. If the response was cut off mid-write, the
+ * script follows it with a newline and an error record — fall back to that line.
+ */
+export function parseResponse(jsonStr: string): AdjudicatorResponse {
+	try {
+		return JSON.parse(jsonStr) as AdjudicatorResponse;
+	} catch (err) {
+		const lastLine = jsonStr.trimEnd().split('\n').pop();
+		if (lastLine === undefined || lastLine === jsonStr.trimEnd()) throw err;
+		return JSON.parse(lastLine) as AdjudicatorResponse;
+	}
+}
+
 /** Call the Python adjudicator subprocess */
-async function callAdjudicator(request: Record<string, unknown>): Promise<Record<string, unknown>> {
+export async function callAdjudicator(
+	request: Record<string, unknown>,
+): Promise<Record<string, unknown>> {
 	const input = JSON.stringify(request);
 
 	return new Promise((resolveP, reject) => {
 		const proc = spawn(getPythonPath(), [SCRIPT_PATH], {
 			stdio: ['pipe', 'pipe', 'pipe'],
+			// Size hint lets the script read stdin into a preallocated buffer
+			env: { ...process.env, ADJUDICATOR_INPUT_BYTES: String(Buffer.byteLength(input)) },
 			timeout: 30_000,
 		});
 
@@ -60,7 +78,7 @@ async function callAdjudicator(request: Record<string, unknown>): Promise<Record
 					console.warn('[adjudicator stdout noise]', stdout.slice(0, jsonStart).trim());
 				}
 
-				const response = JSON.parse(jsonStr) as AdjudicatorResponse;
+				const response = parseResponse(jsonStr);
 				if (!response.ok) {
 					reject(new Error(`Adjudicator error: ${response.error ?? 'unknown'}`));
 					return;
@@ -93,12 +111,8 @@ export async function newGame(): Promise<{
 	};
 }
 
-/** Set orders for powers and process (adjudicate) the current phase */
-export async function setOrdersAndProcess(
-	gameState: unknown,
-	orders: Record<string, string[]>,
-	render = false,
-): Promise<{
+/** State after adjudicating a phase */
+export interface ProcessResult {
 	gameState: unknown;
 	phase: string;
 	units: Record<Power, string[]>;
@@ -110,13 +124,9 @@ export async function setOrdersAndProcess(
 		orders: Record<string, string[]>;
 		results: Record<string, string[]>;
 	};
-}> {
-	const result = await callAdjudicator({
-		op: 'set_orders_and_process',
-		game_state: gameState,
-		orders,
-		render,
-	});
+}
+
+function toProcessResult(result: Record<string, unknown>): ProcessResult {
 	return {
 		gameState: result['game_state'],
 		phase: result['phase'] as string,
@@ -130,6 +140,34 @@ export async function setOrdersAndProcess(
 	};
 }
 
+/** Set orders for powers and process (adjudicate) the current phase */
+export async function setOrdersAndProcess(
+	gameState: unknown,
+	orders: Record<string, string[]>,
+	render = false,
+): Promise<ProcessResult> {
+	const result = await callAdjudicator({
+		op: 'set_orders_and_process',
+		game_state: gameState,
+		orders,
+		render,
+	});
+	return toProcessResult(result);
+}
+
+/** Adjudicate each order set against its own copy of the same game state */
+export async function batchProcess(
+	gameState: unknown,
+	ordersList: Record<string, string[]>[],
+): Promise<ProcessResult[]> {
+	const result = await callAdjudicator({
+		op: 'batch_process',
+		game_state: gameState,
+		orders_list: ordersList,
+	});
+	return (result['results'] as Record<string, unknown>[]).map(toProcessResult);
+}
+
 /** Get all possible orders for the current phase, organized by power */
 export async function getPossibleOrders(gameState: unknown): Promise<{
 	phase: string;
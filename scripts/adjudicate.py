@@ -5,30 +5,74 @@ Diplomacy adjudication bridge — stateless subprocess.
 Accepts JSON on stdin, returns JSON on stdout.
 Each call is independent: pass full game state in, get results out.
 
+With --server, runs as a persistent worker instead: one JSON request per
+stdin line, one JSON response per stdout line. Games created by new_game
+stay in memory and later ops can pass "game_id" instead of "game_state",
+skipping the replay of the full phase history on every call. close_game
+drops a game from memory.
+
 Operations:
   new_game          → Create a new standard game, return initial state
   set_orders        → Set orders for powers (without processing)
   process           → Process current phase (adjudicate), return new state
+  batch_process     → Process each of "orders_list" against a copy of the same state
   get_possible      → Get possible orders for the current phase
   get_state         → Get current game state (units, centers, phase)
   render_map        → Render current state as SVG
+  close_game        → Drop an in-memory game (--server mode only)
 
 Input format:
   { "op": "...", "game_state": {...}, "orders": {...}, "render": true }
 
+  set_orders_and_process also accepts "want_full_state": false to skip echoing
+  game_state back (only phase, units, centers and order_results are returned).
+  set_orders_and_process (with render) and render_map accept "svg_out": a file
+  path to write the SVG to; the result then carries "svg_path" instead of "svg".
+  get_state accepts "include": ["units", ...] to return only some of phase,
+  units, centers and is_game_done.
+
 Output format:
   { "ok": true, "result": {...} }
   { "ok": false, "error": "..." }
 """
 
-import json
+import contextlib
+import os
 import re
 import sys
 from diplomacy import Game
 from diplomacy.utils.export import to_saved_game_format, from_saved_game_format
 
+try:
+    import orjson
+
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:  # orjson is optional — fall back to stdlib json
+    import json
+
+    json_loads = json.loads
+
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
 POWERS_RE = r"austria|england|france|germany|italy|russia|turkey"
 
+# Fields returned by get_state; the get_state op can request a subset via "include"
+STATE_FIELDS = ("phase", "units", "centers", "is_game_done")
+
+# Power names on the standard map, in the order the library reports them
+STANDARD_POWERS = ("AUSTRIA", "ENGLAND", "FRANCE", "GERMANY", "ITALY", "RUSSIA", "TURKEY")
+
+# Power class attributes — if none appear, the SVG has nothing to recolor
+POWER_CLASS_TOKENS = tuple(f'class="{power}"' for power in POWERS_RE.split("|"))
+
+# Colored province path (has power class, self-closing). Captures the power class
+# and, when present, the province id — one linear pass over the SVG.
+COLORED_PATH_RE = re.compile(
+    r'<path\s+class="(' + POWERS_RE + r')"(?:[^/]*\bid="(_[a-z_]+)")?[^/]*/>'
+)
+
 
 def strip_non_sc_coloring(svg, centers):
     """Replace power coloring with neutral fill for non-supply-center provinces.
@@ -38,36 +82,57 @@ def strip_non_sc_coloring(svg, centers):
     <path class="france" d="..." id="_xxx"/> element. For non-SC provinces
     we swap the power class for "nopower" (antiquewhite fill, defined in the
     SVG stylesheet).
+
+    An SVG with no power-colored elements at all is returned untouched.
     """
-    all_scs = set()
-    for power_centers in centers.values():
-        all_scs.update(c.upper()[:3] for c in power_centers)
+    if not any(token in svg for token in POWER_CLASS_TOKENS):
+        return svg
+
+    all_scs = frozenset(c[:3].upper() for power_centers in centers.values() for c in power_centers)
 
     def replace_match(match):
         path_text = match.group(0)
-        id_match = re.search(r'id="(_[a-z_]+)"', path_text)
-        if not id_match:
+        province_id = match.group(2)
+        if not province_id:
             return path_text  # can't determine province, keep it
-        province = id_match.group(1).lstrip("_").upper()[:3]
-        if province in all_scs:
+        if province_id.lstrip("_").upper()[:3] in all_scs:
             return path_text  # supply center, keep coloring
-        # Non-SC: swap power class for neutral "nopower"
-        return re.sub(r'class="(?:' + POWERS_RE + r')"', 'class="nopower"', path_text)
+        # Non-SC: swap the matched power class for neutral "nopower"
+        return path_text.replace(f'class="{match.group(1)}"', 'class="nopower"', 1)
 
-    # Match colored province paths (have power class, self-closing)
-    pattern = re.compile(r'\s*<path\s+class="(?:' + POWERS_RE + r')"[^/]*/>')
-    return pattern.sub(replace_match, svg)
+    return COLORED_PATH_RE.sub(replace_match, svg)
 
 
-def new_game():
-    """Create a fresh standard Diplomacy game."""
-    game = Game()
+def power_names(game):
+    """Power names for the game's map — the cached tuple for the standard map."""
+    if game.map_name == "standard":
+        return STANDARD_POWERS
+    return tuple(game.get_map_power_names())
+
+
+def units_and_centers(game):
+    """Build the per-power units and centers dicts in a single pass."""
+    get_units = game.get_units
+    get_centers = game.get_centers
+    units = {}
+    centers = {}
+    for name in power_names(game):
+        units[name] = get_units(name)
+        centers[name] = get_centers(name)
+    return units, centers
+
+
+def new_game(game=None):
+    """Create a fresh standard Diplomacy game (or describe one just created)."""
+    if game is None:
+        game = Game()
     saved = to_saved_game_format(game)
+    units, centers = units_and_centers(game)
     return {
         "game_state": saved,
         "phase": game.get_current_phase(),
-        "units": {name: game.get_units(name) for name in game.get_map_power_names()},
-        "centers": {name: game.get_centers(name) for name in game.get_map_power_names()},
+        "units": units,
+        "centers": centers,
     }
 
 
@@ -76,63 +141,107 @@ def load_game(game_state):
     return from_saved_game_format(game_state)
 
 
-def get_state(game):
-    """Extract current state from a game."""
-    return {
-        "phase": game.get_current_phase(),
-        "units": {name: game.get_units(name) for name in game.get_map_power_names()},
-        "centers": {name: game.get_centers(name) for name in game.get_map_power_names()},
-        "is_game_done": game.is_game_done,
-    }
-
-
-def set_orders_and_process(game, orders, render=False):
+def get_state(game, include=STATE_FIELDS):
+    """Extract current state from a game, limited to the fields named in include."""
+    if "units" in include and "centers" in include:
+        units, centers = units_and_centers(game)
+    elif "units" in include:
+        get_units = game.get_units
+        units = {name: get_units(name) for name in power_names(game)}
+    elif "centers" in include:
+        get_centers = game.get_centers
+        centers = {name: get_centers(name) for name in power_names(game)}
+
+    state = {}
+    if "phase" in include:
+        state["phase"] = game.get_current_phase()
+    if "units" in include:
+        state["units"] = units
+    if "centers" in include:
+        state["centers"] = centers
+    if "is_game_done" in include:
+        state["is_game_done"] = game.is_game_done
+    return state
+
+
+def process_phase(game, orders):
     """
     Set orders for specified powers and process the phase.
 
     orders: { "FRANCE": ["A PAR - BUR", ...], "ENGLAND": [...] }
     Powers not in orders dict will have their units hold (civil disorder).
+
+    Returns only the new state and the just-processed phase's order results —
+    not the full game_state, whose size grows with the game history.
     """
     for power_name, power_orders in orders.items():
         game.set_orders(power_name, power_orders)
 
     game.process()
 
-    saved = to_saved_game_format(game)
-    result = {
-        "game_state": saved,
-        **get_state(game),
-    }
+    result = get_state(game)
 
-    # Extract order results from the just-processed phase (last in history before current)
-    # saved['phases'] includes all completed phases; the most recently completed one is last
-    completed_phases = [p for p in saved.get("phases", []) if p["name"] != game.get_current_phase()]
-    if completed_phases:
-        last_phase = completed_phases[-1]
+    # Extract order results from the just-processed phase (the last one in history).
+    # The library appends phases chronologically, so there's no need to scan them all.
+    if game.state_history:
+        last_phase = game.get_phase_history(from_phase=-1)[-1].to_dict()
         result["order_results"] = {
             "orders": last_phase.get("orders", {}),
             "results": last_phase.get("results", {}),
         }
 
+    return result
+
+
+def set_orders_and_process(game, orders, render=False, want_full_state=True, render_cache=None):
+    """
+    Process the phase via process_phase, optionally echoing the full game state.
+
+    With want_full_state=False the caller is expected to already hold the
+    previous state and only gets the delta back.
+    """
+    if render_cache is not None:
+        render_cache.pop(game.game_id, None)
+
+    result = process_phase(game, orders)
+
+    if want_full_state:
+        result = {"game_state": to_saved_game_format(game), **result}
+
     if render:
-        svg = game.render(incl_abbrev=True)
-        result["svg"] = strip_non_sc_coloring(svg, result["centers"])
+        result["svg"] = render_svg(game, result["centers"], render_cache)
 
     return result
 
 
+def batch_process(snapshot, orders_list, render=False, want_full_state=True):
+    """
+    Process each order set against its own copy of a saved game.
+
+    Returns one set_orders_and_process result per entry of orders_list. Each
+    copy is reloaded from the snapshot (to_saved_game_format output), which is
+    far cheaper than deepcopy of a Game (that also copies the map).
+    """
+    return {
+        "results": [
+            set_orders_and_process(load_game(snapshot), orders, render, want_full_state)
+            for orders in orders_list
+        ],
+    }
+
+
 def get_possible_orders(game):
     """Get all possible orders for the current phase, organized by power."""
     all_possible = game.get_all_possible_orders()
-    by_power = {}
-
-    for power_name in game.get_map_power_names():
-        locs = game.get_orderable_locations(power_name)
-        power_orders = {}
-        for loc in locs:
-            if loc in all_possible:
-                power_orders[loc] = all_possible[loc]
-        by_power[power_name] = power_orders
+    get_orderable_locations = game.get_orderable_locations
+    by_power = {
+        power_name: {
+            loc: all_possible[loc]
+            for loc in get_orderable_locations(power_name)
+            if loc in all_possible
+        }
+        for power_name in power_names(game)
+    }
 
     return {
         "phase": game.get_current_phase(),
@@ -140,59 +249,286 @@ def get_possible_orders(game):
     }
 
 
-def render_map(game):
+def render_svg(game, centers, render_cache=None):
+    """
+    Render the map and strip non-SC coloring.
+
+    render_cache (server mode) maps game_id → (phase, svg) so re-rendering an
+    unchanged game skips both game.render and strip_non_sc_coloring.
+    """
+    phase = game.get_current_phase()
+    if render_cache is not None:
+        cached = render_cache.get(game.game_id)
+        if cached is not None and cached[0] == phase:
+            return cached[1]
+
+    svg = strip_non_sc_coloring(game.render(incl_abbrev=True), centers)
+    if render_cache is not None:
+        render_cache[game.game_id] = (phase, svg)
+    return svg
+
+
+def render_map(game, render_cache=None):
     """Render the current game state as SVG."""
-    svg = game.render(incl_abbrev=True)
-    centers = {name: game.get_centers(name) for name in game.get_map_power_names()}
+    get_centers = game.get_centers
+    centers = {name: get_centers(name) for name in power_names(game)}
     return {
-        "svg": strip_non_sc_coloring(svg, centers),
+        "svg": render_svg(game, centers, render_cache),
         "phase": game.get_current_phase(),
     }
 
 
-def main():
-    try:
-        raw = sys.stdin.read()
-        request = json.loads(raw)
-    except json.JSONDecodeError as e:
-        json.dump({"ok": False, "error": f"Invalid JSON: {e}"}, sys.stdout)
+# Pre-encoded validation errors — written as-is, so they can't fail to encode
+ERR_MISSING_GAME_STATE = b'{"ok":false,"error":"Missing game_state"}'
+ERR_UNKNOWN_OP = b'{"ok":false,"error":"Unknown op: %s"}'
+SAFE_OP_RE = re.compile(r"[A-Za-z0-9_]*")
+
+# Largest ADJUDICATOR_INPUT_BYTES hint we preallocate for; bigger hints read stdin normally
+MAX_INPUT_HINT = 64 * 1024 * 1024
+
+
+def unknown_op_error(op):
+    """Error envelope for an unrecognized op, pre-encoded when op needs no escaping."""
+    if isinstance(op, str) and SAFE_OP_RE.fullmatch(op):
+        return ERR_UNKNOWN_OP % op.encode()
+    return {"ok": False, "error": f"Unknown op: {op}"}
+
+
+def write_svg(result, path):
+    """Move result["svg"] out to a file, leaving its path in result["svg_path"]."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(result.pop("svg"))
+    result["svg_path"] = path
+
+
+def write_response(response, newline=False):
+    """Write a response as UTF-8 JSON bytes to stdout.
+
+    response is an envelope dict, or an already-encoded envelope (bytes).
+
+    Stateless success envelopes are streamed piecewise — the (large) game_state
+    is encoded on its own rather than as part of one serialized copy of the
+    whole response. If encoding fails partway, the partial output is terminated
+    with a newline followed by an error record, so the parent can resync.
+
+    With newline (server mode) every response must be exactly one line, so all
+    pieces are encoded before anything is written; on failure only the error
+    record is written. Write errors (e.g. a closed pipe) propagate as-is.
+    """
+    out = sys.stdout.buffer
+    # Flush any text the diplomacy library printed first, so it stays ahead of our JSON
+    sys.stdout.flush()
+    if isinstance(response, bytes):
+        out.write(response)
+    elif response.get("ok") and newline:
+        try:
+            chunks = list(_result_chunks(response["result"]))
+        except (TypeError, ValueError) as e:  # orjson's JSONEncodeError is a TypeError
+            out.write(_encode_error(e))
+        else:
+            out.writelines(chunks)
+    elif response.get("ok"):
+        chunks = _result_chunks(response["result"])
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            except (TypeError, ValueError) as e:
+                out.write(b"\n")
+                out.write(_encode_error(e))
+                break
+            out.write(chunk)
+    else:
+        out.write(json_dumps(response))
+    if newline:
+        out.write(b"\n")
+    out.flush()
+
+
+def _encode_error(e):
+    """Error envelope for a response that failed to encode."""
+    return json_dumps({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+
+def _result_chunks(result):
+    """Yield {"ok":true,"result":...} as encoded pieces, without building the envelope."""
+    if not isinstance(result, dict) or "game_state" not in result:
+        yield b'{"ok":true,"result":'
+        yield json_dumps(result)
+        yield b"}"
         return
 
+    yield b'{"ok":true,"result":{"game_state":'
+    yield json_dumps(result["game_state"])
+    rest = {key: value for key, value in result.items() if key != "game_state"}
+    if rest:
+        yield b"," + json_dumps(rest)[1:]  # drop the sibling dict's opening brace
+    else:
+        yield b"}"
+    yield b"}"
+
+
+def handle_request(request, games=None, render_cache=None):
+    """
+    Run a single request and return its response envelope.
+
+    games is the in-memory game table in server mode (None when stateless).
+    There, new_game registers the game under its id, and other ops accept
+    "game_id" in place of "game_state" to operate on it in place.
+    render_cache holds the last rendered SVG per registered game.
+    """
+    if not isinstance(request, dict):
+        return {"ok": False, "error": f"Request must be a JSON object, got {type(request).__name__}"}
+
     op = request.get("op")
 
     try:
         if op == "new_game":
-            result = new_game()
-
-        elif op in ("set_orders_and_process", "get_possible", "get_state", "render_map"):
+            game = Game()
+            result = new_game(game)
+            if games is not None:
+                games[game.game_id] = game
+                result["game_id"] = game.game_id
+
+        elif op in (
+            "set_orders_and_process",
+            "batch_process",
+            "get_possible",
+            "get_state",
+            "render_map",
+        ):
             game_state = request.get("game_state")
-            if not game_state:
-                json.dump({"ok": False, "error": "Missing game_state"}, sys.stdout)
-                return
-
-            game = load_game(game_state)
+            game_id = request.get("game_id")
+            cache = None
+            if game_state:
+                # batch_process reloads copies from game_state itself
+                game = None if op == "batch_process" else load_game(game_state)
+            elif games is not None and game_id:
+                game = games.get(game_id)
+                if game is None:
+                    return {"ok": False, "error": f"Unknown game_id: {game_id}"}
+                # Only games held in memory are cached; a passed-in game_state
+                # could reuse an id and phase with different contents.
+                cache = render_cache
+            else:
+                return ERR_MISSING_GAME_STATE
+
+            svg_out = request.get("svg_out")
+            render = request.get("render", False)
+            if svg_out and (op == "render_map" or (op == "set_orders_and_process" and render)):
+                # Check the path is writable now: failing after processing would leave the
+                # in-memory game advanced behind an error response
+                open(svg_out, "a").close()
+            else:
+                svg_out = None
 
             if op == "set_orders_and_process":
                 orders = request.get("orders", {})
                 render = request.get("render", False)
-                result = set_orders_and_process(game, orders, render)
+                want_full_state = request.get("want_full_state", True)
+                result = set_orders_and_process(game, orders, render, want_full_state, cache)
+            elif op == "batch_process":
+                orders_list = request.get("orders_list", [])
+                render = request.get("render", False)
+                want_full_state = request.get("want_full_state", True)
+                snapshot = game_state if game_state else to_saved_game_format(game)
+                result = batch_process(snapshot, orders_list, render, want_full_state)
             elif op == "get_possible":
                 result = get_possible_orders(game)
             elif op == "get_state":
-                result = get_state(game)
+                include = request.get("include")
+                if include is None:
+                    include = STATE_FIELDS
+                elif not isinstance(include, (list, tuple)):
+                    return {"ok": False, "error": "include must be a list of field names"}
+                unknown = [field for field in include if field not in STATE_FIELDS]
+                if unknown:
+                    return {
+                        "ok": False,
+                        "error": f"Unknown include fields: {', '.join(map(str, unknown))}",
+                    }
+                result = get_state(game, include)
             elif op == "render_map":
-                result = render_map(game)
+                result = render_map(game, cache)
             else:
                 result = None  # unreachable
 
+            if svg_out:
+                write_svg(result, svg_out)
+
+        elif op == "close_game" and games is not None:
+            game_id = request.get("game_id")
+            if render_cache is not None:
+                render_cache.pop(game_id, None)
+            result = {"closed": games.pop(game_id, None) is not None}
+
         else:
-            json.dump({"ok": False, "error": f"Unknown op: {op}"}, sys.stdout)
-            return
+            return unknown_op_error(op)
 
-        json.dump({"ok": True, "result": result}, sys.stdout)
+        return {"ok": True, "result": result}
 
     except Exception as e:
-        json.dump({"ok": False, "error": f"{type(e).__name__}: {e}"}, sys.stdout)
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+def read_request_bytes():
+    """
+    Read the whole request from stdin as bytes.
+
+    If the parent sets ADJUDICATOR_INPUT_BYTES to the payload size, read straight
+    into a preallocated buffer rather than growing one as chunks arrive.
+    """
+    hint = os.environ.get("ADJUDICATOR_INPUT_BYTES", "")
+    if not (hint.isascii() and hint.isdecimal()) or int(hint) > MAX_INPUT_HINT:
+        return sys.stdin.buffer.read()
+
+    buf = bytearray(int(hint))
+    view = memoryview(buf)
+    fd = sys.stdin.fileno()
+    size = 0
+    while size < len(buf):
+        count = os.readv(fd, [view[size:]])
+        if count == 0:
+            break
+        size += count
+    if size < len(buf):
+        return bytes(view[:size])  # hint was too large
+    rest = sys.stdin.buffer.read()  # anything past a too-small hint
+    return bytes(buf) + rest if rest else buf
+
+
+def serve():
+    """Persistent worker: one JSON request per stdin line, one response line each."""
+    games = {}
+    render_cache = {}
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        try:
+            request = json_loads(line)
+        except ValueError as e:
+            response = {"ok": False, "error": f"Invalid JSON: {e}"}
+        else:
+            # Library print() warnings go to stderr so stdout stays one JSON line per request
+            with contextlib.redirect_stdout(sys.stderr):
+                response = handle_request(request, games, render_cache)
+        write_response(response, newline=True)
+
+
+def main():
+    if "--server" in sys.argv[1:]:
+        serve()
+        return
+
+    data = read_request_bytes()
+    try:
+        request = json_loads(data)
+    except ValueError as e:  # JSONDecodeError in both orjson and stdlib json
+        write_response({"ok": False, "error": f"Invalid JSON: {e}"})
+        return
+
+    write_response(handle_request(request))
 
 
 if __name__ == "__main__":